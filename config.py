@@ -16,7 +16,6 @@ LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 ENABLE_FILE_LOGGING = True
 
 # Настройки напоминаний
-REMINDER_CHECK_INTERVAL = 60  # Проверка каждые 60 секунд
 REPEAT_CHECK_INTERVAL = 300  # Проверка повторных напоминаний каждые 5 минут
 REPEAT_REMINDER_INTERVAL = 1800  # Повтор напоминания каждые 30 минут
 MAX_REMINDER_ATTEMPTS = 3  # Максимальное количество попыток напоминания
@@ -1,10 +1,14 @@
 import asyncio
+import atexit
+import functools
 import logging
 import os
-from datetime import datetime, time, timedelta, date
+import threading
+from datetime import datetime, time, timedelta, date, timezone
 from typing import Dict, List, Optional
+from dataclasses import dataclass
+from zoneinfo import ZoneInfo
 import sqlite3
-import pytz
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
@@ -13,11 +17,14 @@ from telegram.constants import ParseMode
 # Импортируем конфигурацию
 from config import (
     BOT_TOKEN, ALLOWED_USERS, DATABASE_PATH, LOG_LEVEL, LOG_FILE, LOG_FORMAT,
-    REMINDER_CHECK_INTERVAL, REPEAT_REMINDER_INTERVAL, MAX_REMINDER_ATTEMPTS,
+    REPEAT_REMINDER_INTERVAL, MAX_REMINDER_ATTEMPTS,
     REPEAT_CHECK_INTERVAL, REMINDER_TEXT, REPEAT_REMINDER_TEXT, WELCOME_TEXT,
     ENABLE_REPEAT_REMINDERS, ENABLE_FILE_LOGGING, validate_config, create_directories
 )
 
+# Проверка доступа выполняется на каждое сообщение — O(1) поиск вместо списка
+ALLOWED_USERS = frozenset(ALLOWED_USERS)
+
 # Регистрируем адаптеры и конвертеры для sqlite3
 def adapt_datetime(dt):
     return dt.isoformat()
@@ -36,6 +43,9 @@ sqlite3.register_adapter(date, adapt_date)
 sqlite3.register_converter("TIMESTAMP", convert_datetime)
 sqlite3.register_converter("DATE", convert_date)
 
+# Часовой пояс бота — zoneinfo из stdlib, с C-реализацией и без ловушек pytz
+CHICAGO_TZ = ZoneInfo("America/Chicago")
+
 # Проверяем конфигурацию
 config_errors = validate_config()
 if config_errors:
@@ -79,16 +89,58 @@ logger = logging.getLogger(__name__)
 # Устанавливаем уровень логирования для python-telegram-bot
 logging.getLogger("telegram").setLevel(logging.WARNING)
 
+# Канонические SQL-строки: одни и те же объекты на каждый вызов,
+# чтобы внутренний кэш подготовленных выражений sqlite3 попадал всегда
+_SQL_ADD_VITAMIN = "INSERT INTO vitamins (user_id, name, reminder_time) VALUES (?, ?, ?)"
+_SQL_GET_VITAMINS = "SELECT id, name, reminder_time, is_active FROM vitamins WHERE user_id = ? AND is_active = 1"
+_SQL_GET_ALL_ACTIVE_VITAMINS = "SELECT user_id, id, name, reminder_time FROM vitamins WHERE is_active = 1"
+_SQL_GET_VITAMIN_BY_ID = "SELECT name, reminder_time FROM vitamins WHERE id = ? AND user_id = ? AND is_active = 1"
+_SQL_ADD_LOG = "INSERT INTO vitamin_logs (vitamin_id, user_id, status) VALUES (?, ?, ?)"
+_SQL_DEL_REMINDER = "DELETE FROM active_reminders WHERE vitamin_id = ? AND user_id = ? AND reminder_date = ?"
+_SQL_ADD_REMINDER = "INSERT OR IGNORE INTO active_reminders (vitamin_id, user_id, reminder_date, last_reminder) VALUES (?, ?, ?, ?)"
+_SQL_GET_ACTIVE = '''
+    SELECT ar.id, ar.vitamin_id, v.name, ar.attempts, ar.last_reminder
+    FROM active_reminders ar
+    JOIN vitamins v ON ar.vitamin_id = v.id
+    WHERE ar.user_id = ? AND ar.reminder_date = ?
+'''
+_SQL_UPDATE_ATTEMPT = "UPDATE active_reminders SET attempts = attempts + 1, last_reminder = ? WHERE id = ?"
+_SQL_DELETE_VITAMIN = "UPDATE vitamins SET is_active = 0 WHERE id = ? AND user_id = ?"
+
 class VitaminDatabase:
     def __init__(self, db_path: str = None):
         self.db_path = db_path or DATABASE_PATH
+        self._lock = threading.Lock()
         self.init_database()
-    
+
     def init_database(self):
         """Инициализация базы данных"""
-        with sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
-            cursor = conn.cursor()
-            
+        # Одно долгоживущее соединение вместо sqlite3.connect() на каждый запрос:
+        # экономим открытие файла и сохраняем страничный кэш между запросами.
+        self._conn = sqlite3.connect(
+            self.db_path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            isolation_level=None,  # autocommit, транзакции через BEGIN/COMMIT явно
+            cached_statements=256
+        )
+        with self._lock:
+            cursor = self._conn.cursor()
+
+            # Настройка соединения: WAL и кэш на всё время жизни процесса
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Ограничиваем рост WAL-файла у вечно работающего процесса
+            cursor.execute("PRAGMA journal_size_limit=10485760")
+            cursor.execute("PRAGMA wal_autocheckpoint=1000")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-20000")
+            # mmap: чтение страниц напрямую из отображённого файла без read()
+            cursor.execute("PRAGMA mmap_size=268435456")
+            # Инкрементальный автовакуум: вступает в силу на свежей базе
+            # (или после VACUUM ниже) и позволяет возвращать страницы порциями
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
             # Таблица витаминов
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS vitamins (
@@ -125,121 +177,143 @@ class VitaminDatabase:
                     FOREIGN KEY (vitamin_id) REFERENCES vitamins (id)
                 )
             ''')
-            
-            conn.commit()
-    
-    def add_vitamin(self, user_id: int, name: str, reminder_time: str) -> bool:
-        """Добавление нового витамина"""
+
+            # Уникальность «одно напоминание на витамин в день» — опора для INSERT OR IGNORE
+            cursor.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_ar_vit_user_date "
+                "ON active_reminders(vitamin_id, user_id, reminder_date)"
+            )
+
+            # Индексы под горячие запросы циклов напоминаний и статистики
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_vit_user_active ON vitamins(user_id, is_active)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_ar_user_date ON active_reminders(user_id, reminder_date)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_logs_user_status ON vitamin_logs(user_id, status)"
+            )
+            cursor.execute("ANALYZE")
+
+            # Ежедневная ротация active_reminders фрагментирует файл — при
+            # заметной доле свободных страниц уплотняем базу один раз на старте
+            freelist = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+            if page_count and freelist > page_count * 0.1:
+                cursor.execute("VACUUM")
+
+            # Обновляем статистику планировщика запросов
+            cursor.execute("PRAGMA optimize")
+
+    def run_optimize(self):
+        """Запуск PRAGMA optimize для обновления статистики планировщика"""
         try:
-            with sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO vitamins (user_id, name, reminder_time) VALUES (?, ?, ?)",
-                    (user_id, name, reminder_time)
-                )
-                conn.commit()
-                return True
+            with self._lock:
+                self._conn.execute("PRAGMA optimize")
+        except Exception as e:
+            logger.error(f"Ошибка выполнения PRAGMA optimize: {e}")
+
+    def run_incremental_vacuum(self, pages: int = 100):
+        """Возврат части свободных страниц файлу базы"""
+        try:
+            with self._lock:
+                self._conn.execute(f"PRAGMA incremental_vacuum({pages})")
+        except Exception as e:
+            logger.error(f"Ошибка выполнения incremental_vacuum: {e}")
+
+    def add_vitamin(self, user_id: int, name: str, reminder_time: str) -> Optional[int]:
+        """Добавление нового витамина, возвращает id новой записи"""
+        try:
+            with self._lock:
+                cursor = self._conn.execute(_SQL_ADD_VITAMIN, (user_id, name, reminder_time))
+                return cursor.lastrowid
         except Exception as e:
             logger.error(f"Ошибка добавления витамина: {e}")
-            return False
-    
+            return None
+
     def get_user_vitamins(self, user_id: int) -> List[tuple]:
         """Получение всех витаминов пользователя"""
-        with sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, name, reminder_time, is_active FROM vitamins WHERE user_id = ? AND is_active = 1",
-                (user_id,)
-            )
+        with self._lock:
+            cursor = self._conn.execute(_SQL_GET_VITAMINS, (user_id,))
             return cursor.fetchall()
-    
+
+    def get_vitamin_by_id(self, vitamin_id: int, user_id: int) -> Optional[tuple]:
+        """Получение одного витамина по первичному ключу"""
+        with self._lock:
+            cursor = self._conn.execute(_SQL_GET_VITAMIN_BY_ID, (vitamin_id, user_id))
+            return cursor.fetchone()
+
+    def get_all_active_vitamins(self) -> List[tuple]:
+        """Получение всех активных витаминов всех пользователей"""
+        with self._lock:
+            cursor = self._conn.execute(_SQL_GET_ALL_ACTIVE_VITAMINS)
+            return cursor.fetchall()
+
     def log_vitamin_intake(self, vitamin_id: int, user_id: int, status: str = 'taken') -> bool:
         """Запись о приёме витамина"""
         try:
-            chicago_tz = pytz.timezone("America/Chicago")
-            with sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO vitamin_logs (vitamin_id, user_id, status) VALUES (?, ?, ?)",
-                    (vitamin_id, user_id, status)
-                )
-                # Удаляем активное напоминание если витамин принят
-                if status == 'taken':
-                    today = datetime.now(chicago_tz).date()
-                    cursor.execute(
-                        "DELETE FROM active_reminders WHERE vitamin_id = ? AND user_id = ? AND reminder_date = ?",
-                        (vitamin_id, user_id, today)
-                    )
-                conn.commit()
-                return True
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.execute(_SQL_ADD_LOG, (vitamin_id, user_id, status))
+                    # Удаляем активное напоминание если витамин принят
+                    if status == 'taken':
+                        today = datetime.now(CHICAGO_TZ).date()
+                        self._conn.execute(_SQL_DEL_REMINDER, (vitamin_id, user_id, today))
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            return True
         except Exception as e:
             logger.error(f"Ошибка записи приёма витамина: {e}")
             return False
-    
-    def add_active_reminder(self, vitamin_id: int, user_id: int) -> bool:
-        """Добавление активного напоминания"""
+
+    def add_active_reminder(self, vitamin_id: int, user_id: int, reminder_date: date = None, now: datetime = None) -> bool:
+        """Добавление активного напоминания
+
+        reminder_date/now вычисляются один раз за тик задачи и передаются сюда,
+        чтобы не запрашивать время заново на каждую строку.
+        """
         try:
-            chicago_tz = pytz.timezone("America/Chicago")
-            today = datetime.now(chicago_tz).date()
-            with sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
-                cursor = conn.cursor()
-                # Проверяем, есть ли уже напоминание на сегодня
-                cursor.execute(
-                    "SELECT id FROM active_reminders WHERE vitamin_id = ? AND user_id = ? AND reminder_date = ?",
-                    (vitamin_id, user_id, today)
-                )
-                if not cursor.fetchone():
-                    cursor.execute(
-                        "INSERT INTO active_reminders (vitamin_id, user_id, reminder_date, last_reminder) VALUES (?, ?, ?, ?)",
-                        (vitamin_id, user_id, today, datetime.now(chicago_tz))
-                    )
-                    conn.commit()
-                return True
+            if reminder_date is None:
+                reminder_date = datetime.now(CHICAGO_TZ).date()
+            if now is None:
+                now = datetime.now(timezone.utc)
+            with self._lock:
+                # INSERT OR IGNORE: уникальный индекс сам отсекает дубликат на сегодня.
+                # last_reminder храним в UTC — сравнение интервалов без tz-объектов.
+                self._conn.execute(_SQL_ADD_REMINDER, (vitamin_id, user_id, reminder_date, now))
+            return True
         except Exception as e:
             logger.error(f"Ошибка добавления напоминания: {e}")
             return False
-    
-    def get_active_reminders(self, user_id: int) -> List[tuple]:
+
+    def get_active_reminders(self, user_id: int, today: date = None) -> List[tuple]:
         """Получение активных напоминаний"""
-        chicago_tz = pytz.timezone("America/Chicago")
-        today = datetime.now(chicago_tz).date()
-        with sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT ar.id, ar.vitamin_id, v.name, ar.attempts, ar.last_reminder
-                FROM active_reminders ar
-                JOIN vitamins v ON ar.vitamin_id = v.id
-                WHERE ar.user_id = ? AND ar.reminder_date = ?
-            ''', (user_id, today))
+        if today is None:
+            today = datetime.now(CHICAGO_TZ).date()
+        with self._lock:
+            cursor = self._conn.execute(_SQL_GET_ACTIVE, (user_id, today))
             return cursor.fetchall()
-    
+
     def update_reminder_attempt(self, reminder_id: int) -> bool:
         """Обновление попытки напоминания"""
         try:
-            chicago_tz = pytz.timezone("America/Chicago")
-            with sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE active_reminders SET attempts = attempts + 1, last_reminder = ? WHERE id = ?",
-                    (datetime.now(chicago_tz), reminder_id)
-                )
-                conn.commit()
-                return True
+            with self._lock:
+                self._conn.execute(_SQL_UPDATE_ATTEMPT, (datetime.now(timezone.utc), reminder_id))
+            return True
         except Exception as e:
             logger.error(f"Ошибка обновления попытки: {e}")
             return False
-    
+
     def delete_vitamin(self, vitamin_id: int, user_id: int) -> bool:
         """Удаление витамина"""
         try:
-            with sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE vitamins SET is_active = 0 WHERE id = ? AND user_id = ?",
-                    (vitamin_id, user_id)
-                )
-                conn.commit()
-                return True
+            with self._lock:
+                self._conn.execute(_SQL_DELETE_VITAMIN, (vitamin_id, user_id))
+            return True
         except Exception as e:
             logger.error(f"Ошибка удаления витамина: {e}")
             return False
@@ -247,8 +321,38 @@ class VitaminDatabase:
 # Глобальная переменная для базы данных
 db = VitaminDatabase()
 
+# PRAGMA optimize перед завершением процесса, как советует документация SQLite
+atexit.register(db.run_optimize)
+
+# Состояние пользователя: шаг диалога добавления витамина и личные настройки.
+# slots=True — доступ к полям по фиксированному смещению вместо поиска в dict.
+@dataclass(slots=True)
+class UserState:
+    step: str = ""
+    name: str = ""
+    repeat_reminders: bool = ENABLE_REPEAT_REMINDERS
+
 # Словарь для хранения состояний пользователей
-user_states = {}
+user_states: Dict[int, UserState] = {}
+
+def get_user_state(user_id: int) -> UserState:
+    """Получение (или создание) состояния пользователя"""
+    state = user_states.get(user_id)
+    if state is None:
+        state = user_states[user_id] = UserState()
+    return state
+
+@functools.lru_cache(maxsize=256)
+def _reminder_markup(vitamin_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура напоминания — одна и та же для каждого витамина, кэшируем"""
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("✅ Принял", callback_data=f"taken_{vitamin_id}"),
+            InlineKeyboardButton("⏰ Через 5 мин", callback_data=f"postpone_5_{vitamin_id}"),
+            InlineKeyboardButton("⏰ Через 10 мин", callback_data=f"postpone_10_{vitamin_id}"),
+            InlineKeyboardButton("⏰ Через 20 мин", callback_data=f"postpone_20_{vitamin_id}")
+        ]
+    ])
 
 def check_user_access(user_id: int) -> bool:
     """Проверка доступа пользователя"""
@@ -282,16 +386,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     text = update.message.text
-    
-    if text == "💊 Мои витамины":
-        await show_vitamins(update, context)
-    elif text == "➕ Добавить витамин":
-        await add_vitamin_start(update, context)
-    elif text == "📊 Статистика":
-        await show_statistics(update, context)
-    elif text == "⚙️ Настройки":
-        await show_settings(update, context)
-    elif user_id in user_states:
+
+    handler = _MSG_DISPATCH.get(text)
+    if handler is not None:
+        await handler(update, context)
+    elif user_id in user_states and user_states[user_id].step:
         await handle_user_input(update, context)
     else:
         await update.message.reply_text("Используйте кнопки меню для навигации.")
@@ -319,43 +418,48 @@ async def show_vitamins(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def add_vitamin_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начало добавления витамина"""
     user_id = update.effective_user.id
-    user_states[user_id] = {"step": "name"}
-    
+    state = get_user_state(user_id)
+    state.step = "name"
+    state.name = ""
+
     await update.message.reply_text("💊 Введите название витамина:")
 
 async def handle_user_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка пользовательского ввода"""
     user_id = update.effective_user.id
-    state = user_states.get(user_id, {})
+    state = get_user_state(user_id)
     text = update.message.text
-    
-    if state.get("step") == "name":
-        user_states[user_id]["name"] = text
-        user_states[user_id]["step"] = "time"
+
+    if state.step == "name":
+        state.name = text
+        state.step = "time"
         await update.message.reply_text(
             f"⏰ Введите время напоминания для '{text}' в формате ЧЧ:ММ\n" +
             "Например: 09:00 или 18:30"
         )
-    
-    elif state.get("step") == "time":
+
+    elif state.step == "time":
         try:
             # Проверяем формат времени
             time_obj = datetime.strptime(text, "%H:%M").time()
-            
+
             # Сохраняем витамин в базу
-            name = user_states[user_id]["name"]
-            if db.add_vitamin(user_id, name, text):
+            name = state.name
+            vitamin_id = db.add_vitamin(user_id, name, text)
+            if vitamin_id:
                 await update.message.reply_text(f"✅ Витамин '{name}' добавлен!\nНапоминание установлено на {text}")
-                
-                # Очищаем состояние
-                del user_states[user_id]
-                
-                # Запускаем напоминание
-                await schedule_vitamin_reminder(context, user_id, name, time_obj)
+
+                # Очищаем состояние (настройки пользователя сохраняются)
+                state.step = ""
+                state.name = ""
+
+                # Запускаем ежедневное напоминание
+                schedule_vitamin_reminder(context.job_queue, user_id, vitamin_id, name, time_obj)
             else:
                 await update.message.reply_text("❌ Ошибка при добавлении витамина. Попробуйте ещё раз.")
-                del user_states[user_id]
-        
+                state.step = ""
+                state.name = ""
+
         except ValueError:
             await update.message.reply_text("❌ Неверный формат времени. Используйте ЧЧ:ММ (например, 09:00)")
 
@@ -366,18 +470,10 @@ async def send_postponed_reminder(context: ContextTypes.DEFAULT_TYPE):
     vitamin_id = job.data["vitamin_id"]
     vitamin_name = job.data["vitamin_name"]
     reminder_time = job.data["reminder_time"]
-    
+
     # Отправляем напоминание
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Принял", callback_data=f"taken_{vitamin_id}"),
-            InlineKeyboardButton("⏰ Через 5 мин", callback_data=f"postpone_5_{vitamin_id}"),
-            InlineKeyboardButton("⏰ Через 10 мин", callback_data=f"postpone_10_{vitamin_id}"),
-            InlineKeyboardButton("⏰ Через 20 мин", callback_data=f"postpone_20_{vitamin_id}")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    reply_markup = _reminder_markup(vitamin_id)
+
     try:
         await context.bot.send_message(
             chat_id=user_id,
@@ -387,72 +483,85 @@ async def send_postponed_reminder(context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Ошибка отправки отложенного напоминания пользователю {user_id}: {e}")
 
+async def _handle_taken(rest: str, query, user_id: int, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка кнопки «Принял»"""
+    vitamin_id = int(rest)
+    if db.log_vitamin_intake(vitamin_id, user_id, "taken"):
+        await query.edit_message_text("✅ Отлично! Приём витамина отмечен.")
+    else:
+        await query.edit_message_text("❌ Ошибка при записи. Попробуйте ещё раз.")
+
+async def _handle_delete(rest: str, query, user_id: int, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка кнопки «Удалить»"""
+    vitamin_id = int(rest)
+    if db.delete_vitamin(vitamin_id, user_id):
+        unschedule_vitamin_reminder(context.job_queue, vitamin_id)
+        await query.edit_message_text("🗑️ Витамин удалён.")
+    else:
+        await query.edit_message_text("❌ Ошибка при удалении.")
+
+async def _handle_postpone(rest: str, query, user_id: int, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка отложенного напоминания"""
+    delay_str, _, vitamin_str = rest.partition("_")
+    delay = int(delay_str)  # 5, 10 или 20 минут
+    vitamin_id = int(vitamin_str)
+
+    # Получаем информацию о витамине
+    vitamin = db.get_vitamin_by_id(vitamin_id, user_id)
+    if not vitamin:
+        await query.edit_message_text("❌ Витамин не найден.")
+        return
+
+    vitamin_name, reminder_time = vitamin
+
+    # Планируем отложенное напоминание
+    context.job_queue.run_once(
+        send_postponed_reminder,
+        delay * 60,  # Переводим минуты в секунды
+        data={
+            "user_id": user_id,
+            "vitamin_id": vitamin_id,
+            "vitamin_name": vitamin_name,
+            "reminder_time": reminder_time
+        }
+    )
+
+    await query.edit_message_text(f"⏰ Напоминание отложено на {delay} минут.")
+
+async def _handle_toggle(rest: str, query, user_id: int, context: ContextTypes.DEFAULT_TYPE):
+    """Переключение настройки повторных напоминаний"""
+    if rest != "repeat_reminders":
+        return
+    state = get_user_state(user_id)
+    state.repeat_reminders = not state.repeat_reminders
+    await query.edit_message_text(
+        f"Повторные напоминания теперь {'включены' if state.repeat_reminders else 'выключены'}."
+    )
+
+# Диспетчеризация callback-данных по префиксу: один partition + поиск в dict
+_CALLBACK_DISPATCH = {
+    "taken": _handle_taken,
+    "delete": _handle_delete,
+    "postpone": _handle_postpone,
+    "toggle": _handle_toggle,
+}
+
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка нажатий на inline кнопки"""
     query = update.callback_query
     await query.answer()
-    
+
     user_id = query.from_user.id
     data = query.data
-    
+
     if not check_user_access(user_id):
         await query.edit_message_text("❌ У вас нет доступа к этому боту.")
         return
-    
-    if data.startswith("taken_"):
-        vitamin_id = int(data.split("_")[1])
-        if db.log_vitamin_intake(vitamin_id, user_id, "taken"):
-            await query.edit_message_text("✅ Отлично! Приём витамина отмечен.")
-        else:
-            await query.edit_message_text("❌ Ошибка при записи. Попробуйте ещё раз.")
-    
-    elif data.startswith("delete_"):
-        vitamin_id = int(data.split("_")[1])
-        if db.delete_vitamin(vitamin_id, user_id):
-            await query.edit_message_text("🗑️ Витамин удалён.")
-        else:
-            await query.edit_message_text("❌ Ошибка при удалении.")
-    
-    elif data.startswith("postpone_"):
-        # Обработка отложенного напоминания
-        parts = data.split("_")
-        delay = int(parts[1])  # 5, 10 или 20 минут
-        vitamin_id = int(parts[2])
-        
-        # Получаем информацию о витамине
-        vitamins = db.get_user_vitamins(user_id)
-        vitamin = next((v for v in vitamins if v[0] == vitamin_id), None)
-        if not vitamin:
-            await query.edit_message_text("❌ Витамин не найден.")
-            return
-        
-        vitamin_name, reminder_time = vitamin[1], vitamin[2]
-        
-        # Планируем отложенное напоминание
-        context.job_queue.run_once(
-            send_postponed_reminder,
-            delay * 60,  # Переводим минуты в секунды
-            data={
-                "user_id": user_id,
-                "vitamin_id": vitamin_id,
-                "vitamin_name": vitamin_name,
-                "reminder_time": reminder_time
-            }
-        )
-        
-        await query.edit_message_text(f"⏰ Напоминание отложено на {delay} минут.")
-    
-    elif data == "toggle_repeat_reminders":
-        # Переключаем настройку повторных напоминаний
-        if "settings" not in user_states:
-            user_states["settings"] = {}
-        if user_id not in user_states["settings"]:
-            user_states["settings"][user_id] = {"repeat_reminders": ENABLE_REPEAT_REMINDERS}
-        
-        user_states["settings"][user_id]["repeat_reminders"] = not user_states["settings"][user_id]["repeat_reminders"]
-        await query.edit_message_text(
-            f"Повторные напоминания теперь {'включены' if user_states['settings'][user_id]['repeat_reminders'] else 'выключены'}."
-        )
+
+    prefix, _, rest = data.partition("_")
+    handler = _CALLBACK_DISPATCH.get(prefix)
+    if handler is not None:
+        await handler(rest, query, user_id, context)
 
 async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать статистику"""
@@ -487,15 +596,9 @@ async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать настройки"""
     user_id = update.effective_user.id
-    
-    # Предположим, у нас есть глобальный словарь для пользовательских настроек
-    if "settings" not in user_states:
-        user_states["settings"] = {}
-    if user_id not in user_states["settings"]:
-        user_states["settings"][user_id] = {"repeat_reminders": ENABLE_REPEAT_REMINDERS}
-    
+
     # Текущие настройки пользователя
-    repeat_reminders = user_states["settings"][user_id]["repeat_reminders"]
+    repeat_reminders = get_user_state(user_id).repeat_reminders
     
     # Формируем текст настроек
     text = "⚙️ Ваши настройки:\n\n"
@@ -514,92 +617,127 @@ async def show_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(text, reply_markup=reply_markup)
 
-async def schedule_vitamin_reminder(context: ContextTypes.DEFAULT_TYPE, user_id: int, vitamin_name: str, reminder_time: time):
-    """Планирование напоминания"""
-    # Эта функция будет вызываться планировщиком
-    pass
+# Диспетчеризация кнопок меню: один поиск в dict вместо цепочки сравнений
+_MSG_DISPATCH = {
+    "💊 Мои витамины": show_vitamins,
+    "➕ Добавить витамин": add_vitamin_start,
+    "📊 Статистика": show_statistics,
+    "⚙️ Настройки": show_settings,
+}
+
+def schedule_vitamin_reminder(job_queue, user_id: int, vitamin_id: int, vitamin_name: str, reminder_time: time):
+    """Планирование ежедневного напоминания о витамине
+
+    JobQueue просыпается ровно в момент напоминания вместо опроса каждую минуту.
+    Имя задачи vit_<id> позволяет снять её при удалении витамина.
+    """
+    job_queue.run_daily(
+        send_scheduled_reminder,
+        time=reminder_time.replace(tzinfo=CHICAGO_TZ),
+        data={
+            "user_id": user_id,
+            "vitamin_id": vitamin_id,
+            "vitamin_name": vitamin_name,
+            "reminder_time": reminder_time.strftime("%H:%M")
+        },
+        name=f"vit_{vitamin_id}"
+    )
 
-async def send_vitamin_reminder(context: ContextTypes.DEFAULT_TYPE):
-    """Отправка напоминаний о витаминах"""
-    chicago_tz = pytz.timezone("America/Chicago")
-    current_time = datetime.now(chicago_tz).time()
-    current_time_str = current_time.strftime("%H:%M")
-    
-    # Проверяем всех пользователей
-    for user_id in ALLOWED_USERS:
-        vitamins = db.get_user_vitamins(user_id)
-        
-        for vitamin_id, name, reminder_time, is_active in vitamins:
-            if reminder_time == current_time_str:
-                # Создаём активное напоминание
-                db.add_active_reminder(vitamin_id, user_id)
-                
-                # Отправляем напоминание
-                keyboard = [
-                    [
-                        InlineKeyboardButton("✅ Принял", callback_data=f"taken_{vitamin_id}"),
-                        InlineKeyboardButton("⏰ Через 5 мин", callback_data=f"postpone_5_{vitamin_id}"),
-                        InlineKeyboardButton("⏰ Через 10 мин", callback_data=f"postpone_10_{vitamin_id}"),
-                        InlineKeyboardButton("⏰ Через 20 мин", callback_data=f"postpone_20_{vitamin_id}")
-                    ]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                try:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=REMINDER_TEXT.format(vitamin_name=name, reminder_time=reminder_time),
-                        reply_markup=reply_markup
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки напоминания пользователю {user_id}: {e}")
+def unschedule_vitamin_reminder(job_queue, vitamin_id: int):
+    """Снятие ежедневного напоминания при удалении витамина"""
+    for job in job_queue.get_jobs_by_name(f"vit_{vitamin_id}"):
+        job.schedule_removal()
+
+# Ограничитель параллельных отправок: Telegram допускает ~30 сообщений/с глобально
+_send_semaphore = asyncio.Semaphore(10)
+
+async def _send_message_limited(bot, chat_id: int, text: str, reply_markup):
+    """Отправка сообщения с ограничением числа одновременных запросов"""
+    async with _send_semaphore:
+        await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+
+async def _gather_sends(tasks):
+    """Параллельный запуск отправок с логированием ошибок"""
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка отправки напоминания: {result}")
+
+async def _send_one_reminder(context: ContextTypes.DEFAULT_TYPE, user_id: int, vitamin_id: int, name: str, reminder_time: str):
+    """Отправка одного напоминания пользователю"""
+    reply_markup = _reminder_markup(vitamin_id)
+
+    await _send_message_limited(
+        context.bot,
+        user_id,
+        REMINDER_TEXT.format(vitamin_name=name, reminder_time=reminder_time),
+        reply_markup
+    )
+
+async def send_scheduled_reminder(context: ContextTypes.DEFAULT_TYPE):
+    """Отправка ежедневного напоминания, запланированного через run_daily"""
+    job = context.job
+    user_id = job.data["user_id"]
+    vitamin_id = job.data["vitamin_id"]
+    vitamin_name = job.data["vitamin_name"]
+    reminder_time = job.data["reminder_time"]
+
+    # Витамин могли удалить после планирования — тогда снимаем задачу
+    if db.get_vitamin_by_id(vitamin_id, user_id) is None:
+        job.schedule_removal()
+        return
+
+    db.add_active_reminder(vitamin_id, user_id)
+    await _send_one_reminder(context, user_id, vitamin_id, vitamin_name, reminder_time)
 
 async def send_repeat_reminders(context: ContextTypes.DEFAULT_TYPE):
     """Отправка повторных напоминаний"""
-    chicago_tz = pytz.timezone("America/Chicago")
+    now = datetime.now(timezone.utc)
+    today = datetime.now(CHICAGO_TZ).date()
+    tasks = []
     for user_id in ALLOWED_USERS:
         # Проверяем настройки пользователя
-        if "settings" in user_states and user_id in user_states["settings"]:
-            if not user_states["settings"][user_id]["repeat_reminders"]:
+        state = user_states.get(user_id)
+        if state is not None:
+            if not state.repeat_reminders:
                 continue  # Пропускаем, если повторные напоминания выключены
-        else:
-            if not ENABLE_REPEAT_REMINDERS:
-                continue  # Пропускаем, если повторные напоминания выключены глобально
+        elif not ENABLE_REPEAT_REMINDERS:
+            continue  # Пропускаем, если повторные напоминания выключены глобально
         
-        reminders = db.get_active_reminders(user_id)
+        reminders = db.get_active_reminders(user_id, today)
         
         for reminder_id, vitamin_id, vitamin_name, attempts, last_reminder in reminders:
-            # Проверяем, прошло ли достаточно времени с последнего напоминания
-            last_time = datetime.fromisoformat(last_reminder).replace(tzinfo=chicago_tz)
-            current_time = datetime.now(chicago_tz)
-            if current_time - last_time >= timedelta(seconds=REPEAT_REMINDER_INTERVAL) and attempts < MAX_REMINDER_ATTEMPTS:
+            # Проверяем, прошло ли достаточно времени с последнего напоминания.
+            # last_reminder хранится в UTC и уже распарсен конвертером TIMESTAMP.
+            if (now - last_reminder).total_seconds() >= REPEAT_REMINDER_INTERVAL and attempts < MAX_REMINDER_ATTEMPTS:
                 
                 # Обновляем попытку
                 db.update_reminder_attempt(reminder_id)
                 
                 # Отправляем повторное напоминание
-                keyboard = [
-                    [
-                        InlineKeyboardButton("✅ Принял", callback_data=f"taken_{vitamin_id}"),
-                        InlineKeyboardButton("⏰ Через 5 мин", callback_data=f"postpone_5_{vitamin_id}"),
-                        InlineKeyboardButton("⏰ Через 10 мин", callback_data=f"postpone_10_{vitamin_id}"),
-                        InlineKeyboardButton("⏰ Через 20 мин", callback_data=f"postpone_20_{vitamin_id}")
-                    ]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                try:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=REPEAT_REMINDER_TEXT.format(
-                            vitamin_name=vitamin_name,
-                            attempt=attempts + 1,
-                            max_attempts=MAX_REMINDER_ATTEMPTS
-                        ),
-                        reply_markup=reply_markup
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки повторного напоминания: {e}")
+                reply_markup = _reminder_markup(vitamin_id)
+
+                tasks.append(_send_message_limited(
+                    context.bot,
+                    user_id,
+                    REPEAT_REMINDER_TEXT.format(
+                        vitamin_name=vitamin_name,
+                        attempt=attempts + 1,
+                        max_attempts=MAX_REMINDER_ATTEMPTS
+                    ),
+                    reply_markup
+                ))
+
+    if tasks:
+        await _gather_sends(tasks)
+
+async def run_database_optimize(context: ContextTypes.DEFAULT_TYPE):
+    """Периодическое обновление статистики планировщика SQLite"""
+    db.run_optimize()
+
+async def run_database_vacuum(context: ContextTypes.DEFAULT_TYPE):
+    """Ежедневный возврат свободных страниц базе"""
+    db.run_incremental_vacuum()
 
 def main():
     """Основная функция"""
@@ -619,9 +757,21 @@ def main():
     
     # Добавляем периодические задачи
     job_queue = application.job_queue
-    job_queue.run_repeating(send_vitamin_reminder, interval=REMINDER_CHECK_INTERVAL, first=10)
+
+    # Регистрируем ежедневные напоминания для уже добавленных витаминов:
+    # JobQueue будит нас точно в срок, опрашивать базу каждую минуту не нужно
+    for user_id, vitamin_id, name, reminder_time in db.get_all_active_vitamins():
+        try:
+            time_obj = datetime.strptime(reminder_time, "%H:%M").time()
+        except ValueError:
+            logger.error(f"Некорректное время напоминания у витамина {vitamin_id}: {reminder_time}")
+            continue
+        schedule_vitamin_reminder(job_queue, user_id, vitamin_id, name, time_obj)
+
     if ENABLE_REPEAT_REMINDERS:
         job_queue.run_repeating(send_repeat_reminders, interval=REPEAT_CHECK_INTERVAL, first=REPEAT_CHECK_INTERVAL)
+    job_queue.run_repeating(run_database_optimize, interval=6 * 3600, first=3600)
+    job_queue.run_repeating(run_database_vacuum, interval=86400, first=86400)
     
     # Запускаем бота
     application.run_polling(allowed_updates=Update.ALL_TYPES)